@@ -0,0 +1,182 @@
+import numpy as np
+import os, re, glob
+from concurrent.futures import ProcessPoolExecutor
+
+# decoding accuracy of the receiver's button responses, read back from the
+# *_log.csv files written by DataFileCollection / get_button_response
+
+stimLabels = ['attention','gratitude','love','sadness','happiness','calming']
+
+cuePattern = re.compile(r'^toucher cue (\S+)$')
+responsePattern = re.compile(r'^receiver responded (\S+) - (?:correct|incorrect)$')
+participantPattern = re.compile(r'.*_P(.+)_log\.csv$')
+
+
+# -- READ LOG FILES --
+
+def read_log_responses(logFileName):
+    # pair each receiver response with the most recent toucher cue
+    trials = []
+    cued = None
+    with open(logFileName) as logFile:
+        next(logFile, None) ## skip header, empty if the session died before it was flushed
+        for line in logFile:
+            event = line.rstrip('\n').split(',',1)[-1]
+            cueMatch = cuePattern.match(event)
+            if cueMatch:
+                cued = cueMatch.group(1)
+                continue
+            responseMatch = responsePattern.match(event)
+            if responseMatch and cued != None:
+                trials.append((cued, responseMatch.group(1)))
+                cued = None
+    return(trials)
+
+def load_participants(folder):
+    # one entry per participant, sessions from the same participant are pooled
+    participants = {}
+    for logFileName in sorted(glob.glob(os.path.join(folder,'*_log.csv'))):
+        participantMatch = participantPattern.match(os.path.basename(logFileName))
+        if participantMatch:
+            participant = participantMatch.group(1)
+        else:
+            participant = os.path.basename(logFileName)
+        trials = read_log_responses(logFileName)
+        if len(trials) > 0:
+            participants.setdefault(participant,[]).extend(trials)
+    return(participants)
+
+# ----
+
+
+# -- CONFUSION TENSORS --
+
+def confusion_tensor(participants, labels = stimLabels):
+    # returns (nParticipants x nCues x nCues) counts of cued (rows) by response (cols),
+    # plus (nParticipants x nCues) counts of cued trials including timeouts
+    labelIndex = dict((label,n) for n,label in enumerate(labels))
+    nCues = len(labels)
+
+    participantIdx, cuedIdx, responseIdx = [], [], []
+    for p, trials in enumerate(participants):
+        for (cued, response) in trials:
+            if cued not in labelIndex:
+                continue
+            participantIdx.append(p)
+            cuedIdx.append(labelIndex[cued])
+            responseIdx.append(labelIndex.get(response,-1)) ## -1 = timeout
+    participantIdx = np.array(participantIdx, dtype=int)
+    cuedIdx = np.array(cuedIdx, dtype=int)
+    responseIdx = np.array(responseIdx, dtype=int)
+
+    nCued = np.zeros((len(participants),nCues), dtype=np.int64)
+    np.add.at(nCued, (participantIdx,cuedIdx), 1)
+
+    answered = responseIdx >= 0
+    confusion = np.zeros((len(participants),nCues,nCues), dtype=np.int64)
+    np.add.at(confusion, (participantIdx[answered],cuedIdx[answered],responseIdx[answered]), 1)
+    return(confusion, nCued)
+
+def cue_scores(confusion, nCued):
+    # per-cue scores over the last two axes, so works on a single matrix,
+    # a stack of participants, or a stack of bootstrap resamples
+    confusion = np.asarray(confusion, dtype=float)
+    nCued = np.asarray(nCued, dtype=float)
+    nCues = confusion.shape[-1]
+    chance = 1.0/nCues
+
+    hits = np.diagonal(confusion, axis1=-2, axis2=-1)
+    nChosen = confusion.sum(axis=-2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accuracy = hits/nCued
+        # rescaled so that chance = 0 and perfect = 1
+        chanceCorrected = (accuracy - chance)/(1 - chance)
+        # Wagner (1993) unbiased hit rate, penalises over-use of a response
+        unbiasedHitRate = hits**2/(nCued*nChosen)
+    unbiasedHitRate = np.where(nChosen > 0, unbiasedHitRate, 0.0)
+    unbiasedHitRate = np.where(nCued > 0, unbiasedHitRate, np.nan)
+    return({'accuracy':accuracy,
+            'chanceCorrected':chanceCorrected,
+            'unbiasedHitRate':unbiasedHitRate})
+
+# ----
+
+
+# -- PARTICIPANT-LEVEL BOOTSTRAP --
+
+def _bootstrap_chunk(confusion, nCued, nResamples, seed):
+    # resample participants with replacement and pool their counts;
+    # each resample is a row of participant weights, so pooling is one matmul.
+    # a resample in which a cue was never cued scores NaN for that cue, and
+    # np.nanquantile in bootstrap_cue_scores silently drops it from the CI
+    nParticipants, nCues = nCued.shape
+    rng = np.random.default_rng(seed)
+    weights = rng.multinomial(nParticipants, np.full(nParticipants, 1.0/nParticipants), size=nResamples)
+
+    pooledConfusion = (weights @ confusion.reshape(nParticipants,-1)).reshape(nResamples,nCues,nCues)
+    pooledCued = weights @ nCued
+    return(cue_scores(pooledConfusion, pooledCued))
+
+def bootstrap_cue_scores(confusion, nCued, nResamples = 10000, ci = 0.95, seed = None, nWorkers = None, chunkSize = 1000):
+    # chunks get their own child seeds, so results depend on seed and chunkSize
+    # but not on the number of worker processes
+    confusion = np.asarray(confusion, dtype=np.int64)
+    nCued = np.asarray(nCued, dtype=np.int64)
+    if nResamples < 1:
+        raise ValueError('nResamples must be at least 1, got {}' .format(nResamples))
+    if chunkSize < 1:
+        raise ValueError('chunkSize must be at least 1, got {}' .format(chunkSize))
+    if nCued.shape[0] < 1:
+        raise ValueError('need at least one participant to bootstrap')
+
+    chunkSizes = [chunkSize]*(nResamples//chunkSize)
+    if nResamples % chunkSize:
+        chunkSizes.append(nResamples % chunkSize)
+    chunkSeeds = np.random.SeedSequence(seed).spawn(len(chunkSizes))
+
+    if nWorkers == 1:
+        chunks = [_bootstrap_chunk(confusion,nCued,n,s) for n,s in zip(chunkSizes,chunkSeeds)]
+    else:
+        with ProcessPoolExecutor(max_workers = nWorkers) as pool:
+            chunks = list(pool.map(_bootstrap_chunk,
+                                    [confusion]*len(chunkSizes),
+                                    [nCued]*len(chunkSizes),
+                                    chunkSizes,
+                                    chunkSeeds))
+
+    observed = cue_scores(confusion.sum(axis=0), nCued.sum(axis=0))
+    alpha = (1 - ci)/2
+    results = {}
+    for score in observed:
+        resamples = np.concatenate([chunk[score] for chunk in chunks])
+        (lower,upper) = np.nanquantile(resamples, [alpha, 1 - alpha], axis=0)
+        results[score] = {'estimate':observed[score],
+                            'lower':lower,
+                            'upper':upper,
+                            'resamples':resamples}
+    return(results)
+
+# ----
+
+
+if __name__ == "__main__":
+    # summary of decoding accuracy for all log files in the data folder
+    import sys
+    folder = sys.argv[1] if len(sys.argv) > 1 else './data/'
+
+    participants = load_participants(folder)
+    if len(participants) == 0:
+        print('No receiver responses found in {}' .format(folder))
+        sys.exit()
+    (confusion, nCued) = confusion_tensor(list(participants.values()))
+    results = bootstrap_cue_scores(confusion, nCued, nResamples = 10000, seed = 1)
+
+    print('{} participants, {} trials, {} answered' .format(len(participants), nCued.sum(), confusion.sum()))
+    print('cue,accuracy,lower,upper,chanceCorrected,unbiasedHitRate')
+    for n, stim in enumerate(stimLabels):
+        print('{},{:.3f},{:.3f},{:.3f},{:.3f},{:.3f}' .format(stim,
+                results['accuracy']['estimate'][n],
+                results['accuracy']['lower'][n],
+                results['accuracy']['upper'][n],
+                results['chanceCorrected']['estimate'][n],
+                results['unbiasedHitRate']['estimate'][n]))